@@ -1,11 +1,15 @@
 # app.py
 # Streamlit: Personalisasi Playlist Musik berdasarkan Klaster Spotify
 
+import concurrent.futures
+import html
 import os
 import json
 import re
+import threading
 from pathlib import Path
 from datetime import datetime
+from functools import lru_cache
 from typing import Optional, Tuple, Dict, List
 
 import numpy as np
@@ -23,7 +27,20 @@ from google.oauth2.service_account import Credentials
 BASE_DIR = Path(__file__).resolve().parent
 
 DATA_PATH = str(BASE_DIR / "top_spotify_clustered.csv")          # aman, tidak nyasar folder
+PARQUET_PATH = str(BASE_DIR / "top_spotify_clustered.parquet")   # cache kolumnar dari CSV
 FEEDBACK_JSONL_PATH = str(BASE_DIR / "feedback_playlist.jsonl")  # feedback format JSONL
+FEEDBACK_COUNT_PATH = FEEDBACK_JSONL_PATH + ".count"             # sidecar: jumlah baris
+
+# Urutan kolom feedback dijaga stabil (JSONL lokal & Google Sheet memakai urutan ini)
+FEEDBACK_COLUMNS = (
+    "timestamp",
+    "user_id",
+    "mood",
+    "chosen_clusters",
+    "rating",
+    "comment",
+    "tracks",
+)
 
 FEATURE_COLUMNS = [
     "danceability",
@@ -90,6 +107,7 @@ COUNTRY_NAME_MAP: Dict[str, str] = {
 # -----------------------------
 # UTIL: COUNTRY (dropdown tanpa kode)
 # -----------------------------
+@lru_cache(maxsize=512)
 def _try_pycountry_name(alpha2: str) -> Optional[str]:
     """Ambil nama negara dari ISO2 via pycountry (opsional). Tidak error kalau pycountry tidak ada."""
     try:
@@ -106,17 +124,21 @@ def normalize_country_value(x: object) -> str:
     return str(x).strip()
 
 
+_ISO2_RE = re.compile(r"^[A-Za-z]{2}$")
+
+
 def looks_like_iso2(code: str) -> bool:
-    return len(code) == 2 and code.isalpha()
+    return _ISO2_RE.match(code) is not None
 
 
-def country_value_to_display(raw_value: object) -> str:
-    """
-    Untuk DROPDOWN:
-    - ISO2: pycountry -> map -> jika gagal return "" (masuk Lainnya)
-    - non ISO2: tampilkan raw (title case)
+@lru_cache(maxsize=1024)
+def _display_for_raw(raw: str) -> Optional[str]:
+    """Dispatch nama tampilan untuk nilai negara yang sudah dinormalisasi.
+
+    Return None khusus ISO2 yang tidak dikenal namanya — pemanggil yang
+    memutuskan mau menampilkan "" (dropdown) atau kodenya (playlist).
+    Di-memo dengan lru_cache: tiap nilai unik hanya dihitung sekali seproses.
     """
-    raw = normalize_country_value(raw_value)
     if not raw:
         return ""
 
@@ -128,45 +150,55 @@ def country_value_to_display(raw_value: object) -> str:
         name_map = COUNTRY_NAME_MAP.get(code)
         if name_map:
             return name_map
-        return ""  # jangan tampilkan kode
+        return None  # ISO2 tak dikenal
 
     return raw.title() if len(raw) > 2 else raw
 
 
+def country_value_to_display(raw_value: object) -> str:
+    """
+    Untuk DROPDOWN:
+    - ISO2: pycountry -> map -> jika gagal return "" (masuk Lainnya)
+    - non ISO2: tampilkan raw (title case)
+    """
+    display = _display_for_raw(normalize_country_value(raw_value))
+    return display if display is not None else ""  # jangan tampilkan kode
+
+
 def build_country_options(df: pd.DataFrame) -> Tuple[List[str], Dict[str, Optional[str]]]:
     """
     options: label yang ditampilkan (tanpa kode)
     mapping: label -> raw_country (untuk filter)
       - "Lainnya" -> None (filter khusus)
     """
-    if "country" not in df.columns:
+    if "_country_norm" not in df.columns:
         return ["Bebas"], {}
 
-    raw_values = (
-        df["country"]
-        .dropna()
-        .map(normalize_country_value)
-        .tolist()
+    # Pasangan (display, raw) unik via drop_duplicates vektor; loop Python
+    # di bawah hanya menyusun label dari nilai unik yang tersisa.
+    pairs = (
+        df.loc[df["_country_norm"].ne(""), ["_country_display", "_country_norm"]]
+        .drop_duplicates()
+        .sort_values("_country_norm")
     )
-    raw_values = sorted({v for v in raw_values if v})
 
     options: List[str] = ["Bebas"]
     display_to_raw: Dict[str, Optional[str]] = {}
 
     used_count: Dict[str, int] = {}
-    unknown_iso2_raw: List[str] = []
+    has_unknown_iso2 = False
 
-    for raw in raw_values:
-        display = country_value_to_display(raw)
+    for display, raw in pairs.itertuples(index=False):
         if display:
             used_count[display] = used_count.get(display, 0) + 1
             label = display if used_count[display] == 1 else f"{display} ({used_count[display]})"
             options.append(label)
             display_to_raw[label] = raw
         else:
-            unknown_iso2_raw.append(raw)
+            # display kosong dengan raw non-kosong = ISO2 tak dikenal
+            has_unknown_iso2 = True
 
-    if unknown_iso2_raw:
+    if has_unknown_iso2:
         options.append("Lainnya")
         display_to_raw["Lainnya"] = None
 
@@ -181,29 +213,46 @@ def country_for_playlist(raw_value: object) -> str:
     - Kalau non ISO2 -> tampilkan raw/titlecase
     """
     raw = normalize_country_value(raw_value)
-    if not raw:
-        return ""
-
-    if looks_like_iso2(raw):
-        code = raw.upper()
-        name_pc = _try_pycountry_name(code)
-        if name_pc:
-            return name_pc
-        name_map = COUNTRY_NAME_MAP.get(code)
-        if name_map:
-            return name_map
-        return code  # tampilkan kode jika tidak dikenal (khusus playlist)
-
-    return raw.title() if len(raw) > 2 else raw
+    display = _display_for_raw(raw)
+    return display if display is not None else raw.upper()
 
 
 # -----------------------------
 # FUNGSI BANTUAN (LOGIKA UTAMA)
 # -----------------------------
-@st.cache_data
-def load_data(path: str) -> pd.DataFrame:
+def _read_dataset(path: str) -> pd.DataFrame:
+    """Baca dataset, lewat cache Parquet kalau memungkinkan.
+
+    Parquet kolumnar & bertipe, jadi start dingin jauh lebih cepat daripada
+    parsing CSV. Kalau pyarrow/fastparquet tidak terpasang, tetap jalan
+    dengan CSV seperti biasa.
+    """
+    try:
+        if os.path.exists(PARQUET_PATH) and os.path.getmtime(PARQUET_PATH) >= os.path.getmtime(path):
+            return pd.read_parquet(PARQUET_PATH)
+    except Exception:
+        pass
+
     df = pd.read_csv(path)
 
+    try:
+        df.to_parquet(PARQUET_PATH)
+    except Exception:
+        pass  # tanpa engine parquet pun aplikasi tetap berfungsi
+
+    return df
+
+
+@st.cache_data
+def load_data(path: str) -> Tuple[pd.DataFrame, Dict]:
+    """Muat dataset + hitung semua turunan yang invarian terhadap df.
+
+    Return `(df, profiles)`; `profiles` berisi array-array kecil hasil
+    groupby/agregasi (profil klaster, pemetaan valence) sehingga callback
+    form hanya menyentuh NumPy, tanpa groupby pandas per rerun.
+    """
+    df = _read_dataset(path)
+
     if "cluster" not in df.columns:
         raise ValueError("Dataset harus memiliki kolom 'cluster'.")
 
@@ -211,35 +260,114 @@ def load_data(path: str) -> pd.DataFrame:
     if missing:
         raise ValueError(f"Dataset harus memiliki kolom fitur audio berikut: {missing}")
 
+    # Kecilkan dtype: default pandas (int64/float64/object) boros memori untuk
+    # data seperti ini. int16/float32 memangkas traffic memori untuk mask &
+    # groupby; kategori membuat perbandingan string jadi perbandingan kode.
+    df["cluster"] = df["cluster"].astype("int16")
+    for col in FEATURE_COLUMNS:
+        df[col] = df[col].astype("float32")
+    for col in ("country", "track_artist"):
+        if col in df.columns:
+            df[col] = df[col].astype("category")
+
     # Siapkan link Spotify jika belum ada
     if "spotify_url" not in df.columns:
         if "track_id" in df.columns:
-            df["spotify_url"] = "https://open.spotify.com/track/" + df["track_id"].astype(str)
+            df["spotify_url"] = (
+                "https://open.spotify.com/track/" + df["track_id"].astype(str)
+            ).astype("string")
         elif "uri" in df.columns:
-            df["spotify_url"] = df["uri"].astype(str).apply(
-                lambda x: "https://open.spotify.com/track/" + x.split(":")[-1]
-            )
+            # .str berjalan di satu loop C; .apply(lambda) memanggil Python per baris
+            ids = df["uri"].astype(str).str.rsplit(":", n=1).str[-1]
+            df["spotify_url"] = ("https://open.spotify.com/track/" + ids).astype("string")
         else:
             df["spotify_url"] = None
 
-    return df
+    # Indeks baris per klaster, dihitung sekali di sini (ikut ter-cache).
+    # Sampling playlist cukup mengambil dari array indeks ini, tanpa
+    # membangun mask boolean + copy subset besar di tiap klik.
+    cluster_arr = df["cluster"].to_numpy()
+    cluster_ids = np.unique(cluster_arr)
+    df.attrs["cluster_ids"] = cluster_ids
+    df.attrs["idx_by_cluster"] = {
+        int(c): np.flatnonzero(cluster_arr == c) for c in cluster_ids
+    }
+
+    # Kolom negara ternormalisasi dihitung sekali di sini (ter-cache); filter
+    # per klik tinggal perbandingan vektor, bukan .apply/.map Python per baris.
+    if "country" in df.columns:
+        norm = df["country"].map(normalize_country_value).fillna("").astype(str)
+        df["_country_norm"] = norm
+        # display dipetakan lewat dict nilai-unik agar pycountry tidak dipanggil per baris
+        df["_country_display"] = norm.map(
+            {v: country_value_to_display(v) for v in norm.unique()}
+        )
+        # "Lainnya" di dropdown = ISO2 yang tidak dikenal namanya
+        df["_country_is_other"] = df["_country_display"].eq("") & norm.str.match(_ISO2_RE)
+
+    # Opsi dropdown negara juga invarian terhadap df — bangun sekali di sini
+    # (termasuk lookup pycountry-nya) daripada di setiap rerun.
+    options, display_to_raw = build_country_options(df)
+    df.attrs["country_options"] = options
+    df.attrs["country_display_to_raw"] = display_to_raw
+
+    feature_min, feature_max, means_arr, cluster_labels, cluster_sqnorms = (
+        prepare_cluster_profiles(df)
+    )
+    profiles = {
+        "mins": feature_min,
+        "maxs": feature_max,
+        "means": means_arr,
+        "labels": cluster_labels,
+        "sqnorms": cluster_sqnorms,
+        "cluster_map": get_cluster_mapping_by_valence(df),
+    }
+
+    return df, profiles
+
+
+@st.cache_resource
+def get_rng() -> np.random.Generator:
+    """Satu Generator (PCG64) dipakai bersama seproses; menghindari
+    pembuatan state RNG baru pada tiap pengambilan sampel."""
+    return np.random.default_rng()
 
 
 def get_cluster_mapping_by_valence(df: pd.DataFrame) -> dict:
-    valence_mean = df.groupby("cluster")["valence"].mean().sort_values(ascending=False)
-    happy_cluster = int(valence_mean.index[0])
-    sad_cluster = int(valence_mean.index[-1])
+    """Dipanggil sekali dari load_data (yang sudah ter-cache).
+
+    Label klaster adalah integer kecil non-negatif, jadi rata-rata valence
+    per klaster bisa dihitung satu pass dengan np.bincount — tanpa hash
+    table dan boxing per grup seperti groupby pandas.
+    """
+    c = df["cluster"].to_numpy()
+    v = df["valence"].to_numpy(dtype=np.float64)
+    sums = np.bincount(c, weights=v)
+    counts = np.bincount(c)
+    # label yang tidak terpakai di rentang 0..max diberi NaN agar tidak terpilih
+    means = np.divide(sums, counts, out=np.full_like(sums, np.nan), where=counts > 0)
+    happy_cluster = int(np.nanargmax(means))
+    sad_cluster = int(np.nanargmin(means))
     return {"happy": happy_cluster, "sad": sad_cluster}
 
 
 def prepare_cluster_profiles(df: pd.DataFrame):
+    """Dipanggil sekali dari load_data (yang sudah ter-cache).
+    Return berupa ndarray polos agar murah disimpan/di-copy."""
     feature_min = df[FEATURE_COLUMNS].min()
     feature_max = df[FEATURE_COLUMNS].max()
     cluster_means = df.groupby("cluster")[FEATURE_COLUMNS].mean()
 
     denom = (feature_max - feature_min).replace(0, 1e-9)
     cluster_means_norm = (cluster_means - feature_min) / denom
-    return feature_min, feature_max, cluster_means_norm
+
+    # Matriks ndarray (K x fitur) + labelnya, supaya pemilihan klaster
+    # bisa dihitung broadcast tanpa iterasi baris pandas
+    means_arr = cluster_means_norm.to_numpy(dtype=np.float64)
+    cluster_labels = cluster_means_norm.index.to_numpy()
+    # ||c||^2 per klaster, disiapkan sekali untuk dekomposisi jarak kuadrat
+    cluster_sqnorms = np.einsum("ij,ij->i", means_arr, means_arr)
+    return feature_min.to_numpy(), feature_max.to_numpy(), means_arr, cluster_labels, cluster_sqnorms
 
 
 def mood_to_valence_pref(mood: str) -> float:
@@ -250,18 +378,23 @@ def mood_to_valence_pref(mood: str) -> float:
     return 0.5
 
 
-def choose_cluster_by_preferences(pref_vector: dict, cluster_means_norm: pd.DataFrame) -> int:
-    user_vec = np.array([pref_vector[c] for c in FEATURE_COLUMNS])
-
-    best_cluster = None
-    best_dist = None
-    for cluster_label, row in cluster_means_norm.iterrows():
-        dist = np.linalg.norm(user_vec - row.to_numpy())
-        if best_dist is None or dist < best_dist:
-            best_dist = dist
-            best_cluster = int(cluster_label)
+def choose_cluster_by_preferences(
+    pref_vector: dict,
+    means_arr: np.ndarray,
+    cluster_labels: np.ndarray,
+    cluster_sqnorms: np.ndarray,
+) -> int:
+    user_vec = np.fromiter(
+        (pref_vector[c] for c in FEATURE_COLUMNS),
+        dtype=np.float64,
+        count=len(FEATURE_COLUMNS),
+    )
 
-    return int(best_cluster)
+    # ||x-c||^2 = ||x||^2 + ||c||^2 - 2 x.c ; suku ||x||^2 sama untuk semua
+    # klaster sehingga boleh dibuang untuk argmin. Sisa hot path-nya cuma
+    # satu perkalian matriks-vektor kecil.
+    dists = cluster_sqnorms - 2.0 * (means_arr @ user_vec)
+    return int(cluster_labels[dists.argmin()])
 
 
 def build_playlist_from_subset(
@@ -269,38 +402,55 @@ def build_playlist_from_subset(
     n_tracks: int,
     fav_query: Optional[str] = None,
 ) -> pd.DataFrame:
-    subset_shuffled = subset.sample(frac=1.0, random_state=None)
+    rng = get_rng()
+    n_rows = len(subset)
 
-    if fav_query:
-        fav = fav_query.strip().lower()
-        if fav:
-            title_series = subset_shuffled.get("track_name", pd.Series("", index=subset_shuffled.index)).astype(str)
-            artist_series = subset_shuffled.get("track_artist", pd.Series("", index=subset_shuffled.index)).astype(str)
+    fav = fav_query.strip() if fav_query else ""
+    if not fav:
+        # Tanpa query favorit: cukup sampel n indeks acak — O(n_tracks),
+        # bukan shuffle + copy seluruh subset
+        pick = rng.choice(n_rows, size=min(n_tracks, n_rows), replace=False)
+        return subset.iloc[pick]
 
-            mask = (
-                title_series.str.lower().str.contains(fav, na=False)
-                | artist_series.str.lower().str.contains(fav, na=False)
-            )
+    title_series = subset.get("track_name", pd.Series("", index=subset.index)).astype(str)
+    artist_series = subset.get("track_artist", pd.Series("", index=subset.index)).astype(str)
 
-            fav_df = subset_shuffled[mask]
-            other_df = subset_shuffled[~mask]
-            return pd.concat([fav_df.head(3), other_df]).head(n_tracks)
+    # case=False menangani huruf besar/kecil langsung di satu pass contains;
+    # tidak perlu alokasi Series lowercase perantara
+    mask = (
+        title_series.str.contains(fav, case=False, regex=False, na=False)
+        | artist_series.str.contains(fav, case=False, regex=False, na=False)
+    ).to_numpy()
 
-    return subset_shuffled.head(n_tracks)
+    # Maks. 3 lagu favorit di urutan teratas, sisanya acak dari non-favorit —
+    # sampling per partisi indeks, tanpa shuffle penuh dan tanpa pd.concat
+    fav_pos = np.flatnonzero(mask)
+    other_pos = np.flatnonzero(~mask)
+
+    n_fav = min(3, fav_pos.size, n_tracks)
+    picked_fav = rng.choice(fav_pos, size=n_fav, replace=False)
+    n_other = min(n_tracks - n_fav, other_pos.size)
+    picked_other = rng.choice(other_pos, size=n_other, replace=False)
+
+    return subset.iloc[np.concatenate([picked_fav, picked_other])]
 
 
 # -----------------------------
 # FEEDBACK (DIPERBAIKI KHUSUS BAGIAN INI)
 # -----------------------------
+# regex dikompilasi sekali di module level, bukan per pemanggilan
+_CTRL_RE = re.compile(r"[\x00-\x08\x0b\x0c\x0e-\x1f\x7f-\x9f]")  # karakter kontrol
+_WS_RE = re.compile(r"\s+")
+
+
 def sanitize_comment(text: str, max_len: int = 500) -> str:
     if text is None:
         return ""
-    t = str(text)
 
-    # buang karakter kontrol aneh, rapikan spasi
-    t = "".join(ch for ch in t if ch.isprintable() or ch in "\n\t")
-    t = t.replace("\t", " ").replace("\n", " ")
-    t = re.sub(r"\s+", " ", t).strip()
+    # buang karakter kontrol aneh lalu rapikan spasi — dua substitusi regex
+    # di level C, bukan loop Python per karakter
+    t = _CTRL_RE.sub("", str(text))
+    t = _WS_RE.sub(" ", t).strip()
 
     # batasi panjang
     if len(t) > max_len:
@@ -327,16 +477,88 @@ def validate_comment_if_filled(raw_text: str) -> str:
     return clean
 
 
+def _scan_feedback_count(path: str) -> int:
+    """Tiap record JSONL diakhiri newline, jadi cukup menghitung b"\\n"
+    per chunk 1 MiB — bytes.count berjalan di level C, memori tetap O(1)."""
+    total = 0
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(1 << 20)
+            if not chunk:
+                return total
+            total += chunk.count(b"\n")
+
+
+# serialisasi read->increment->replace sidecar antar sesi dalam satu proses,
+# supaya dua submit bersamaan tidak saling menimpa hitungan
+_FEEDBACK_COUNT_LOCK = threading.Lock()
+
+
+def _read_feedback_count() -> Optional[int]:
+    try:
+        with open(FEEDBACK_COUNT_PATH, "r", encoding="utf-8") as f:
+            return int(f.read().strip())
+    except (OSError, ValueError):
+        return None
+
+
+def _write_feedback_count(n: int) -> None:
+    # tulis ke file sementara lalu os.replace supaya pembaruannya atomik
+    tmp_path = FEEDBACK_COUNT_PATH + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(str(n))
+    os.replace(tmp_path, FEEDBACK_COUNT_PATH)
+
+
+@st.cache_data
+def feedback_count(path: str, mtime: float, size: int) -> int:
+    """Hitung jumlah baris feedback. `mtime` + `size` ikut jadi kunci cache,
+    jadi hitungan otomatis di-refresh hanya saat file berubah (ukuran
+    menjaga kasus append beruntun dalam resolusi mtime yang sama).
+
+    Sidecar `.count` (di-update saat append) membuat pembacaan O(1)
+    berapa pun besar lognya; kalau sidecar belum ada, fallback ke scan
+    penuh lalu tulis balik hasilnya.
+    """
+    n = _read_feedback_count()
+    if n is not None:
+        return n
+    n = _scan_feedback_count(path)
+    try:
+        with _FEEDBACK_COUNT_LOCK:
+            _write_feedback_count(n)
+    except Exception:
+        pass  # metrik tetap tampil walau sidecar tidak bisa ditulis
+    return n
+
+
 def save_feedback_jsonl_local(row: dict, path: str = FEEDBACK_JSONL_PATH) -> None:
     line = json.dumps(row, ensure_ascii=False) + "\n"
     with open(path, "a", encoding="utf-8") as f:
         f.write(line)
-        f.flush()
-        os.fsync(f.fileno())
+        # fsync adalah disk barrier penuh (skala milidetik) per submit;
+        # close + page cache OS sudah cukup untuk log penelitian begini.
+        # Set SPOTIFY_FEEDBACK_FSYNC=1 kalau butuh durabilitas ketat.
+        if os.environ.get("SPOTIFY_FEEDBACK_FSYNC"):
+            f.flush()
+            os.fsync(f.fileno())
+
+    # Update sidecar count: increment O(1), atau scan penuh sekali kalau belum
+    # ada. Baris feedback di atas sudah tersimpan — kegagalan bookkeeping di
+    # sini (disk penuh, read-only, dst.) tidak boleh menggagalkan submit;
+    # sidecar yang hilang dipulihkan sendiri oleh fallback scan feedback_count.
+    try:
+        with _FEEDBACK_COUNT_LOCK:
+            prev = _read_feedback_count()
+            _write_feedback_count(prev + 1 if prev is not None else _scan_feedback_count(path))
+    except Exception:
+        pass
 
 
-def save_feedback_to_google_sheet(row: dict) -> None:
-    # butuh st.secrets saat deploy
+@st.cache_resource
+def _get_feedback_worksheet():
+    """Kredensial + client gspread + worksheet di-cache seproses; OAuth dan
+    open_by_key (masing-masing round-trip HTTP) hanya terjadi sekali."""
     sheet_id = st.secrets["gspread"]["sheet_id"]
 
     creds_info = dict(st.secrets["gcp_service_account"])
@@ -344,41 +566,46 @@ def save_feedback_to_google_sheet(row: dict) -> None:
     creds = Credentials.from_service_account_info(creds_info, scopes=scopes)
 
     client = gspread.authorize(creds)
-    sh = client.open_by_key(sheet_id)
-    ws = sh.sheet1
+    return client.open_by_key(sheet_id).sheet1
+
+
+def save_feedback_to_google_sheet(row: dict) -> None:
+    # butuh st.secrets saat deploy
+    ws = _get_feedback_worksheet()
 
     payload_json = json.dumps(row, ensure_ascii=False)
 
     ws.append_row(
-        [
-            row.get("timestamp", ""),
-            row.get("user_id", ""),
-            row.get("mood", ""),
-            row.get("chosen_clusters", ""),
-            row.get("rating", ""),
-            row.get("comment", ""),
-            row.get("tracks", ""),
-            payload_json,
-        ],
+        [row.get(col, "") for col in FEEDBACK_COLUMNS] + [payload_json],
         value_input_option="RAW",
     )
 
 
+@st.cache_resource
+def _sheet_executor() -> concurrent.futures.ThreadPoolExecutor:
+    """Satu worker latar belakang untuk append ke Google Sheet."""
+    return concurrent.futures.ThreadPoolExecutor(
+        max_workers=1, thread_name_prefix="sheet-append"
+    )
+
+
 def save_feedback_final(row: dict) -> None:
     # selalu simpan local (bertambah)
     save_feedback_jsonl_local(row)
 
-    # simpan ke Google Sheet kalau secrets tersedia (deploy publik)
+    # kirim ke Google Sheet di latar belakang kalau secrets tersedia —
+    # submit user tidak perlu menunggu round-trip HTTP-nya
     try:
-        save_feedback_to_google_sheet(row)
+        future = _sheet_executor().submit(save_feedback_to_google_sheet, row)
+        # serap exception di worker; local tanpa secrets tetap aman
+        future.add_done_callback(lambda f: f.exception())
     except Exception:
-        # local tanpa secrets tetap aman, tidak bikin app error
         pass
 
 
 def init_session_state():
     defaults = {
-        "playlist": None,
+        "playlist_idx": None,
         "chosen_clusters": None,
         "user_id": None,
         "mood": None,
@@ -391,18 +618,13 @@ def init_session_state():
 
 
 # -----------------------------
-# MAIN APP
+# TAMPILAN STATIS (CSS + HEADER)
 # -----------------------------
-def main():
-    st.set_page_config(
-        page_title="Personalisasi Playlist Musik",
-        page_icon="🎧",
-        layout="wide",
-    )
+# String besar ini konstan, jadi dibangun sekali saat import — bukan
+# dialokasikan ulang di tiap rerun di dalam main().
 
-    # ---------- CSS (RESPONSIF + KONTRAS + FORM CARD) ----------
-    st.markdown(
-        """
+# CSS (RESPONSIF + KONTRAS + FORM CARD)
+_APP_CSS = """
         <style>
         :root{
             --primary:#6366f1;
@@ -487,6 +709,23 @@ def main():
 
         .stSlider label{ font-size:0.92rem; color: var(--text) !important; }
 
+        /* baris playlist (render satu blok markdown) */
+        .track-row{
+            display:flex;
+            align-items:center;
+            justify-content:space-between;
+            gap:1rem;
+            padding:0.55rem 0;
+            border-bottom:1px solid #e5e7eb;
+        }
+        .track-caption{
+            font-size:0.82rem;
+            color: var(--muted) !important;
+            margin-top:0.15rem;
+        }
+        .track-link{ text-align:right; white-space:nowrap; }
+        .track-link .no-link{ color:#6b7280 !important; }
+
         /* divider lebih halus */
         hr{
             border: none;
@@ -501,10 +740,40 @@ def main():
             .header-subtitle{ font-size:0.9rem; }
         }
         </style>
-        """,
-        unsafe_allow_html=True,
+        """
+
+_HEADER_HTML = """
+        <div class="header-card">
+            <div class="header-icon">🎧</div>
+            <div>
+                <div class="header-title">Personalisasi Playlist Musik Spotify</div>
+                <p class="header-subtitle">
+                    Aplikasi uji coba untuk melihat bagaimana klasterisasi fitur audio
+                    dapat digunakan dalam rekomendasi playlist yang sesuai dengan mood dan preferensi pengguna.
+                </p>
+            </div>
+        </div>
+        """
+
+
+# -----------------------------
+# MAIN APP
+# -----------------------------
+def main():
+    st.set_page_config(
+        page_title="Personalisasi Playlist Musik",
+        page_icon="🎧",
+        layout="wide",
     )
 
+    # ---------- CSS ----------
+    # st.html (Streamlit >= 1.33) melewati parser markdown; fallback ke
+    # st.markdown untuk versi lama
+    if hasattr(st, "html"):
+        st.html(_APP_CSS)
+    else:
+        st.markdown(_APP_CSS, unsafe_allow_html=True)
+
     # ---------- SIDEBAR ----------
     with st.sidebar:
         st.markdown("### ℹ️ Tentang Aplikasi")
@@ -521,11 +790,16 @@ def main():
         )
         st.markdown("---")
 
-        # FEEDBACK COUNT (JSONL)
-        if os.path.exists(FEEDBACK_JSONL_PATH):
+        # FEEDBACK COUNT (JSONL) — satu os.stat untuk cek ada/tidaknya file
+        # sekaligus kunci cache (mtime + size)
+        try:
+            fb_stat = os.stat(FEEDBACK_JSONL_PATH)
+        except OSError:
+            fb_stat = None
+
+        if fb_stat is not None:
             try:
-                with open(FEEDBACK_JSONL_PATH, "r", encoding="utf-8") as f:
-                    total = sum(1 for line in f if line.strip())
+                total = feedback_count(FEEDBACK_JSONL_PATH, fb_stat.st_mtime, fb_stat.st_size)
                 st.metric("Total feedback", total)
             except Exception:
                 st.caption("Feedback tersimpan di `feedback_playlist.jsonl`.")
@@ -533,34 +807,23 @@ def main():
             st.caption("Belum ada feedback yang tersimpan.")
 
     # ---------- HEADER ----------
-    st.markdown(
-        """
-        <div class="header-card">
-            <div class="header-icon">🎧</div>
-            <div>
-                <div class="header-title">Personalisasi Playlist Musik Spotify</div>
-                <p class="header-subtitle">
-                    Aplikasi uji coba untuk melihat bagaimana klasterisasi fitur audio
-                    dapat digunakan dalam rekomendasi playlist yang sesuai dengan mood dan preferensi pengguna.
-                </p>
-            </div>
-        </div>
-        """,
-        unsafe_allow_html=True,
-    )
+    st.markdown(_HEADER_HTML, unsafe_allow_html=True)
 
     # ---------- LOAD DATA ----------
     try:
-        df = load_data(DATA_PATH)
+        df, profiles = load_data(DATA_PATH)
     except Exception as e:
         st.error(f"Gagal memuat data: {e}")
         return
 
     init_session_state()
-    _, _, cluster_means_norm = prepare_cluster_profiles(df)
-    cluster_map = get_cluster_mapping_by_valence(df)
+    cluster_means_arr = profiles["means"]
+    cluster_labels = profiles["labels"]
+    cluster_sqnorms = profiles["sqnorms"]
+    cluster_map = profiles["cluster_map"]
 
-    country_options, display_to_raw_country = build_country_options(df)
+    country_options = df.attrs["country_options"]
+    display_to_raw_country = df.attrs["country_display_to_raw"]
 
     # -------------------------
     # 1. FORM PREFERENSI
@@ -645,30 +908,50 @@ def main():
                 "acousticness": scale_1_5(pref_acoustic),
             }
 
-            target_cluster = choose_cluster_by_preferences(feature_pref_vector, cluster_means_norm)
+            target_cluster = choose_cluster_by_preferences(
+                feature_pref_vector, cluster_means_arr, cluster_labels, cluster_sqnorms
+            )
             target_clusters = [target_cluster]
-            subset = df[df["cluster"].isin(target_clusters)].copy()
 
-            # Filter negara (dropdown tanpa kode)
-            if country_pref != "Bebas" and "country" in df.columns:
+            # Ambil baris lewat indeks per klaster yang sudah disiapkan di load_data;
+            # tidak perlu mask isin + .copy() atas seluruh dataframe.
+            # Kalau target mencakup semua klaster, filter klaster jadi no-op —
+            # langsung pakai seluruh rentang baris.
+            if set(map(int, target_clusters)) == set(map(int, df.attrs["cluster_ids"])):
+                eligible_idx = np.arange(len(df))
+            else:
+                idx_by_cluster = df.attrs["idx_by_cluster"]
+                eligible_idx = np.concatenate(
+                    [idx_by_cluster.get(int(c), np.empty(0, dtype=np.intp)) for c in target_clusters]
+                )
+
+            # Filter negara (dropdown tanpa kode), dikerjakan di level indeks
+            # atas kolom ternormalisasi yang sudah disiapkan load_data.
+            if country_pref != "Bebas" and "_country_norm" in df.columns and eligible_idx.size:
                 raw_selected = display_to_raw_country.get(country_pref)
 
                 if raw_selected is None:
                     # "Lainnya" = ISO2 yang tidak dikenal namanya (untuk dropdown)
-                    def is_unknown_iso2(v: object) -> bool:
-                        raw = normalize_country_value(v)
-                        return looks_like_iso2(raw) and (country_value_to_display(raw) == "")
-                    subset = subset[subset["country"].apply(is_unknown_iso2)]
-                elif raw_selected:
-                    subset = subset[subset["country"].map(normalize_country_value) == raw_selected]
-
-            if subset.empty:
+                    keep = df["_country_is_other"].to_numpy()[eligible_idx]
+                else:
+                    keep = df["_country_norm"].to_numpy()[eligible_idx] == raw_selected
+                eligible_idx = eligible_idx[keep]
+
+            if eligible_idx.size == 0:
                 st.error("Tidak ada lagu yang cocok dengan filter tersebut.")
             else:
-                n_rekom = min(n_tracks, len(subset))
-                playlist = build_playlist_from_subset(subset, n_rekom, fav_query=fav_query)
+                n_rekom = min(n_tracks, int(eligible_idx.size))
+                if fav_query.strip():
+                    # pencarian favorit perlu melihat seluruh kandidat, bukan sampel
+                    subset = df.iloc[eligible_idx]
+                    playlist = build_playlist_from_subset(subset, n_rekom, fav_query=fav_query)
+                else:
+                    picked = get_rng().choice(eligible_idx, size=n_rekom, replace=False)
+                    playlist = df.iloc[picked]
 
-                st.session_state["playlist"] = playlist
+                # Simpan posisi barisnya saja (array int32 kecil), bukan DataFrame;
+                # tampilan direkonstruksi dengan df.iloc saat render.
+                st.session_state["playlist_idx"] = playlist.index.to_numpy().astype(np.int32)
                 st.session_state["chosen_clusters"] = target_clusters
                 st.session_state["user_id"] = user_id.strip()
                 st.session_state["mood"] = mood
@@ -680,8 +963,8 @@ def main():
     # -------------------------
     # 2. TAMPILKAN PLAYLIST
     # -------------------------
-    if st.session_state["playlist"] is not None:
-        playlist = st.session_state["playlist"]
+    if st.session_state["playlist_idx"] is not None:
+        playlist = df.iloc[st.session_state["playlist_idx"]]
 
         st.markdown("<div class='section-title'>2. Playlist Rekomendasi untuk Kamu</div>", unsafe_allow_html=True)
 
@@ -708,40 +991,78 @@ def main():
                 "(jika tersedia di dataset)."
             )
 
-        # List lagu
-        for _, row in playlist.iterrows():
-            title = str(row.get("track_name", "Tanpa judul"))
-            artist = str(row.get("track_artist", "Tanpa artis"))
+        # List lagu.
+        # Kolom diekstrak sekali ke array NumPy, lalu loop pakai indeks posisi;
+        # iterrows() membungkus tiap baris jadi Series baru dan jauh lebih lambat.
+        n_rows = len(playlist)
+        titles = (
+            playlist["track_name"].astype(str).tolist()
+            if "track_name" in playlist.columns
+            else ["Tanpa judul"] * n_rows
+        )
+        artists = (
+            playlist["track_artist"].astype(str).tolist()
+            if "track_artist" in playlist.columns
+            else ["Tanpa artis"] * n_rows
+        )
+        urls = playlist["spotify_url"].tolist() if "spotify_url" in playlist.columns else None
 
-            year = row.get("year", "")
-            year_str = ""
+        # Label tahun & negara diformat sekali secara vektor/batch di sini,
+        # bukan lewat pd.notna + int() per baris di dalam loop.
+        if "year" in playlist.columns:
             try:
-                if pd.notna(year) and str(year).strip() != "":
-                    year_str = f" ({int(year)})"
+                y = playlist["year"]
+                year_strs = np.where(
+                    y.notna(), " (" + y.fillna(0).astype(int).astype(str) + ")", ""
+                ).tolist()
             except Exception:
-                year_str = ""
+                year_strs = [""] * n_rows
+        else:
+            year_strs = [""] * n_rows
+
+        if "country" in playlist.columns:
+            country_disps = [country_for_playlist(c) for c in playlist["country"].tolist()]
+        else:
+            country_disps = [""] * n_rows
 
-            spotify_url = row.get("spotify_url", None)
+        row_parts = []
+        for i in range(n_rows):
+            title = html.escape(titles[i])
+            artist = html.escape(artists[i])
+            year_str = year_strs[i]
+
+            spotify_url = urls[i] if urls is not None else None
             spotify_url = spotify_url if isinstance(spotify_url, str) else ""
 
-            country_disp = country_for_playlist(row.get("country", None))
-
-            col1, col2 = st.columns([6, 2], vertical_alignment="center")
-            with col1:
-                st.markdown(f"**{title} — {artist}{year_str}**")
-            with col2:
-                if spotify_url and spotify_url.strip():
-                    st.markdown(
-                        f"<div style='text-align:right;'><a href='{spotify_url}' target='_blank' rel='noopener'>Buka di Spotify</a></div>",
-                        unsafe_allow_html=True,
-                    )
-                else:
-                    st.markdown("<div style='text-align:right; color:#6b7280;'>Link tidak tersedia</div>", unsafe_allow_html=True)
+            if spotify_url.strip():
+                link_html = (
+                    f"<a href='{html.escape(spotify_url, quote=True)}' "
+                    "target='_blank' rel='noopener'>Buka di Spotify</a>"
+                )
+            else:
+                link_html = "<span class='no-link'>Link tidak tersedia</span>"
 
-            if country_disp:
-                st.caption(f"Negara: {country_disp}")
+            country_disp = country_disps[i]
+            caption_html = (
+                f"<div class='track-caption'>Negara: {html.escape(country_disp)}</div>"
+                if country_disp
+                else ""
+            )
 
-            st.divider()
+            row_parts.append(
+                "<div class='track-row'>"
+                f"<div class='track-main'><b>{title} — {artist}{year_str}</b>{caption_html}</div>"
+                f"<div class='track-link'>{link_html}</div>"
+                "</div>"
+            )
+
+        # Satu payload untuk seluruh playlist, bukan ±4 widget per lagu;
+        # blob-nya HTML murni jadi bisa lewat st.html tanpa parser markdown
+        playlist_html = "\n".join(row_parts)
+        if hasattr(st, "html"):
+            st.html(playlist_html)
+        else:
+            st.markdown(playlist_html, unsafe_allow_html=True)
 
         # -------------------------
         # 3. FORM FEEDBACK (DIPERBAIKI)
@@ -769,7 +1090,7 @@ def main():
                 st.warning(str(e))
                 st.stop()
 
-            playlist_df = st.session_state["playlist"]
+            playlist_df = playlist
 
             if "track_id" in playlist_df.columns:
                 track_ids = playlist_df["track_id"].astype(str).tolist()